@@ -1,4 +1,9 @@
 import os
+import time
+import random
+import hashlib
+import types
+from pathlib import Path
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -8,67 +13,165 @@ from rag_chain import (
     delete_course, get_chromadb_info, test_chromadb_connection,
     get_embedding_info
 )
-from generators import (
-    rag_answer,
-    summary_from_context,
-    interview_qs_from_context,
-    quiz_from_context,
-)
-
-from langchain_groq import ChatGroq
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-
 from prompts import SYSTEM_PROMPT
+from utils import clean_option, TOPIC_RE
 
 
 # Load environment variables
-load_dotenv()
-APP_NAME = os.getenv("APP_NAME", "AI Study Companion")
-LOGO_URL = os.getenv("LOGO_URL", "")
+@st.cache_resource(show_spinner=False)  # runs before set_page_config, so no spinner element
+def _env() -> types.SimpleNamespace:
+    """Parse .env once per process rather than on every rerun"""
+    load_dotenv()
+    return types.SimpleNamespace(
+        APP_NAME=os.getenv("APP_NAME", "AI Study Companion"),
+        LOGO_URL=os.getenv("LOGO_URL", ""),
+        GROQ_MODEL=os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"),
+    )
+
+# Chat streaming repaints at most every STREAM_FLUSH_TOKENS chunks or STREAM_FLUSH_SECONDS
+STREAM_FLUSH_TOKENS = 20
+STREAM_FLUSH_SECONDS = 0.04
+
+# Upper bound on retrieved context sent to the LLM; prefill cost grows with prompt length
+CONTEXT_TOKEN_BUDGET = 2000
+
+_SUGGESTED_QUESTIONS = (
+    "What are the main concepts?",
+    "Explain the key topics",
+    "What should I focus on?",
+    "How do concepts connect?",
+)
+
+# (button label, question) pairs shown to new chat users
+_STARTER_QUESTIONS = (
+    ("📖 What are the main topics?", "What are the main topics in my notes?"),
+    ("🎯 Key concepts to remember?", "What are the key concepts I should remember?"),
+    ("📝 Create a study plan", "Can you create a study plan for me?"),
+    ("🤔 What might be challenging?", "What topics might be challenging to understand?"),
+)
 
 # Streamlit page config
-st.set_page_config(page_title=APP_NAME, page_icon="🎓", layout="wide")
+st.set_page_config(page_title=_env().APP_NAME, page_icon="🎓", layout="wide")
+
+@st.cache_data(show_spinner=False)
+def _logo_bytes() -> bytes:
+    return Path("logo.png").read_bytes()
 
 # Display custom logo.png at the top
-st.image("logo.png", width=120)  # Adjust width as needed
-st.title(APP_NAME)
+st.image(_logo_bytes(), width=120)  # Adjust width as needed
+st.title(_env().APP_NAME)
 
-# Performance indicator
-if st.sidebar.button("🧹 Clear All Cache", help="Clear cache to free memory"):
-    clear_all_cache()
-    st.success("Cache cleared! Page will refresh.")
-    st.rerun()
+@st.cache_resource
+def get_llm(model: str, temperature: float):
+    """Shared Groq chat client - cached so HTTP connections are reused across reruns"""
+    from langchain_groq import ChatGroq
+    return ChatGroq(model=model, temperature=temperature)
+
+@st.cache_resource(show_spinner=False)
+def _lc():
+    """LangChain message classes, imported on first chat turn rather than at startup"""
+    from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+    return SystemMessage, HumanMessage, AIMessage
+
+# Static part of the chat system message; only the context is appended per turn
+_SYSTEM_PREFIX = f"{SYSTEM_PROMPT}\n\nCONTEXT:\n"
 
 def init_chat_state():
     if "chat_messages" not in st.session_state:
         st.session_state.chat_messages = []
     if "last_sources" not in st.session_state:
         st.session_state.last_sources = []
+    if "last_context" not in st.session_state:
+        st.session_state.last_context = None
 
 def add_chat_message(role, content):
-    st.session_state.chat_messages.append({"role": role, "content": content})
+    _, HumanMessage, AIMessage = _lc()
+    lc_message = HumanMessage(content=content) if role == "user" else AIMessage(content=content)
+    st.session_state.chat_messages.append({"role": role, "content": content, "lc": lc_message})
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _sidebar_bundle(course_name: str) -> dict:
+    """All sidebar lookups in one cached call - these change on the order of minutes"""
+    return {
+        "status": check_course_status(course_name),
+        "chroma": get_chromadb_info(),
+        "embed": get_embedding_info(),
+    }
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_list_all_courses():
+    return list_all_courses()
+
+def _invalidate_course_caches():
+    """Drop cached course lookups after the indexed data changes"""
+    check_course_status.clear()
+    _sidebar_bundle.clear()
+    _cached_list_all_courses.clear()
+    _context_block.clear()
+
+@st.cache_resource(show_spinner=False)
+def _token_encoder():
+    """cl100k_base encoder, or None if it can't be loaded
+
+    The failure is returned rather than raised so it gets cached: otherwise
+    every context build would retry the (timeout-less) download.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"tiktoken unavailable, capping context by characters: {e}")
+        return None
+
+def _trim_to_budget(text: str) -> str:
+    """Cut text to CONTEXT_TOKEN_BUDGET tokens, or ~4 chars per token if tiktoken is unavailable"""
+    encoder = _token_encoder()
+    if encoder is None:
+        # e.g. offline deploys that can't download cl100k_base
+        return text[:CONTEXT_TOKEN_BUDGET * 4]
+    tokens = encoder.encode(text)
+    if len(tokens) > CONTEXT_TOKEN_BUDGET:
+        return encoder.decode(tokens[:CONTEXT_TOKEN_BUDGET])
+    return text
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
 def build_context_block(course_name: str, user_query: str, k: int = 5):
     """Retrieve top-k chunks for the query and format a short context block."""
+    # Streamlit only hashes the 16-byte digest; the underscored args are skipped
+    key = hashlib.blake2b(
+        f"{course_name}|{k}|{user_query.strip().lower()}".encode(), digest_size=16
+    ).digest()
+    return _context_block(key, course_name, user_query, k)
+
+@st.cache_resource(max_entries=256, ttl=300)  # Shared objects, no pickling on hit
+def _context_block(key: bytes, _course_name: str, _user_query: str, _k: int):
     try:
-        docs = _get_relevant_documents(course_name, user_query, k)
+        docs = _get_relevant_documents(_course_name, _user_query, _k)
         if not docs:
-            return "", []
+            return "", ()
         
         formatted = []
         seen = set()
         for d in docs:
             title = d.metadata.get("source", "doc")
-            key = (title, d.page_content[:80])
-            if key in seen:
+            # str hashes are cached on the object, so hashing full content is cheap
+            h = hash((title, d.page_content))
+            if h in seen:
                 continue
-            seen.add(key)
-            formatted.append(f"[Source: {title}]\n{d.page_content}")
-        return "\n\n".join(formatted), docs
+            seen.add(h)
+            formatted.extend(("[Source: ", title, "]\n", d.page_content, "\n\n"))
+        
+        return _trim_to_budget("".join(formatted[:-1])), tuple(docs)
     except Exception as e:
         st.error(f"Error building context: {e}")
-        return "", []
+        return "", ()
+
+# Performance indicator
+if st.sidebar.button("🧹 Clear All Cache", help="Clear cache to free memory"):
+    clear_all_cache()
+    # Also drops _context_block, a cache_resource that clear_all_cache leaves alone
+    _invalidate_course_caches()
+    st.success("Cache cleared! Page will refresh.")
+    st.rerun()
 
 # Enhanced Sidebar with performance monitoring
 with st.sidebar:
@@ -94,9 +197,11 @@ with st.sidebar:
         key="course_name"
     )
     
+    sidebar_info = _sidebar_bundle(course)
+    
     # Course status check with ChromaDB Cloud
     if course and course != "Demo Course":
-        status = check_course_status(course)
+        status = sidebar_info["status"]
         
         if "error" in status:
             st.error(f"⚠️ **{course}** - Database error: {status['error']}")
@@ -116,8 +221,7 @@ with st.sidebar:
                 st.rerun()
         with col2:
             if st.button("📊", help="Check course status", key="check_files"):
-                status = check_course_status(course)
-                st.json(status)
+                st.json(sidebar_info["status"])
     
     st.markdown("---")
     
@@ -159,16 +263,16 @@ with st.sidebar:
     st.markdown("### 📈 Quick Stats")
     
     # Session statistics
-    if hasattr(st.session_state, 'chat_messages') and st.session_state.chat_messages:
+    if st.session_state.get('chat_messages'):
         chat_count = len([m for m in st.session_state.chat_messages if m["role"] == "user"])
         st.metric("💬 Questions Asked", chat_count)
     
-    if hasattr(st.session_state, 'quiz_data') and st.session_state.quiz_data:
+    if st.session_state.get('quiz_data'):
         st.metric("📝 Quiz Questions", len(st.session_state.quiz_data))
     
     # Course material indicator (using cached status check)
     if course and course != "Demo Course":
-        status = check_course_status(course)
+        status = sidebar_info["status"]
         if status["is_ready"]:
             st.success(f"📚 {status['document_count']} Documents Ready")
         else:
@@ -180,7 +284,7 @@ with st.sidebar:
     st.markdown("### ⚡ Performance")
     
     # ChromaDB connection status
-    chromadb_info = get_chromadb_info()
+    chromadb_info = sidebar_info["chroma"]
     if chromadb_info["connected"]:
         if chromadb_info["using_cloud"]:
             st.success(f"☁️ ChromaDB Cloud ({chromadb_info['total_collections']} collections)")
@@ -190,7 +294,7 @@ with st.sidebar:
         st.error("❌ ChromaDB Connection Failed")
     
     # Embedding model info
-    embedding_info = get_embedding_info()
+    embedding_info = sidebar_info["embed"]
     st.caption(f"🤖 Model: {embedding_info['model_name']}")
     st.caption(f"📐 Dimension: {embedding_info['embedding_dimension']}")
     
@@ -216,14 +320,7 @@ with st.sidebar:
     if section == "Chat":
         if st.button("🎲 Random Question", use_container_width=True, key="sidebar_random"):
             if 'suggested_question' not in st.session_state:
-                questions = [
-                    "What are the main concepts?",
-                    "Explain the key topics",
-                    "What should I focus on?",
-                    "How do concepts connect?"
-                ]
-                import random
-                st.session_state.suggested_question = random.choice(questions)
+                st.session_state.suggested_question = random.choice(_SUGGESTED_QUESTIONS)
                 st.rerun()
     
     elif section == "Quiz":
@@ -268,6 +365,132 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
 
+@st.fragment
+def _chat_fragment(course: str, document_count: int):
+    """Chat controls, history and streaming - reruns on its own, without the sidebar"""
+    # Simple controls
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("🧹 Clear Chat"):
+            st.session_state.chat_messages = []
+            st.session_state.last_sources = []
+            st.session_state.last_context = None
+            st.rerun()
+    
+    with col2:
+        show_sources = st.checkbox("📚 Show Sources", value=True)
+    
+    with col3:
+        st.caption(f"⚡ {document_count} docs ready")
+    
+    # Chat history
+    for m in st.session_state.chat_messages:
+        with st.chat_message(m["role"]):
+            st.markdown(m["content"])
+    
+    # Chat input
+    user_input = st.chat_input("Ask a question about this course...")
+    
+    # Handle sidebar quick actions
+    suggested = st.session_state.pop('suggested_question', None)
+    if suggested:
+        user_input = suggested
+    
+    if user_input:
+        # Add user message
+        add_chat_message("user", user_input)
+        
+        with st.chat_message("user"):
+            st.markdown(user_input)
+        
+        # Get context with performance timing; build_context_block is cached and
+        # invalidated on upload/delete, so a repeated question is a cache hit
+        with st.spinner("🔍 Searching notes..."):
+            start = time.time()
+            context_text, docs = build_context_block(course, user_input, k=5)
+            search_time = time.time() - start
+        # Kept only so sources and perf info can be rendered on later reruns
+        st.session_state.last_context = (course, user_input, context_text, docs, search_time)
+        
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            streamed_text = ""
+            
+            if not context_text.strip():
+                streamed_text = "I don't find this in the class notes."
+                placeholder.markdown(streamed_text)
+                add_chat_message("assistant", streamed_text)
+                st.session_state.last_sources = []
+            else:
+                SystemMessage, HumanMessage, _ = _lc()
+                
+                # Build system message with context
+                sys = SystemMessage(content=_SYSTEM_PREFIX + context_text)
+                
+                # Conversation history (last 8 messages), prebuilt by add_chat_message
+                history_msgs = [m["lc"] for m in st.session_state.chat_messages[-8:]]
+                
+                lc_messages = [sys, *history_msgs, HumanMessage(content=user_input)]
+                groq_model = _env().GROQ_MODEL
+                llm = get_llm(groq_model, 0.3)
+                
+                try:
+                    # Stream response, repainting in batches rather than per token
+                    parts = []
+                    pending = 0
+                    last_flush = time.monotonic()
+                    for chunk in llm.stream(lc_messages):
+                        parts.append(chunk.content or "")
+                        pending += 1
+                        if pending >= STREAM_FLUSH_TOKENS or time.monotonic() - last_flush > STREAM_FLUSH_SECONDS:
+                            placeholder.markdown("".join(parts) + "▌")
+                            pending = 0
+                            last_flush = time.monotonic()
+                    
+                    streamed_text = "".join(parts)
+                    placeholder.markdown(streamed_text)
+                    
+                except Exception as e:
+                    # Fallback to non-streaming
+                    try:
+                        resp = llm.invoke(lc_messages)
+                        streamed_text = (resp.content or "").strip()
+                        placeholder.markdown(streamed_text)
+                    except:
+                        streamed_text = "Sorry, I'm having trouble connecting. Please try again."
+                        placeholder.markdown(streamed_text)
+                
+                add_chat_message("assistant", streamed_text)
+                st.session_state.last_sources = [d.metadata.get("source", "Unknown") for d in docs]
+        
+    # Sources and timings come from session state, so toggling these never re-runs retrieval
+    if st.session_state.last_context and st.session_state.chat_messages:
+        *_, context_text, _, search_time = st.session_state.last_context
+        
+        # Show sources if enabled
+        if show_sources and st.session_state.last_sources:
+            with st.expander(f"📚 Sources ({len(st.session_state.last_sources)} documents) - Search took {search_time:.2f}s"):
+                for source in st.session_state.last_sources:
+                    st.caption(f"• {source}")
+        
+        # Performance info for debugging
+        if st.checkbox("🔧 Show Performance Info", key="perf_debug"):
+            st.caption(f"Search time: {search_time:.2f}s | Context length: {len(context_text)} chars")
+    
+    # Welcome message for new users
+    if not st.session_state.chat_messages:
+        st.info("👋 Welcome! Ask me anything about your course materials. I'll search through your uploaded notes to help answer your questions.")
+        
+        # Simple starter questions
+        st.markdown("**💡 Try asking:**")
+        cols = st.columns(2)
+        
+        for i, (label, question) in enumerate(_STARTER_QUESTIONS):
+            with cols[i // 2]:
+                if st.button(label, use_container_width=True):
+                    st.session_state.suggested_question = question
+                    st.rerun()
+
 # Updated Admin section with better UX and cache clearing
 if section == "Admin (Upload/Index)":
     st.markdown("""
@@ -287,6 +510,7 @@ if section == "Admin (Upload/Index)":
             with col1:
                 if st.button("🗑️ Clear Course Data", type="secondary"):
                     if delete_course(course):
+                        _invalidate_course_caches()
                         st.success("Course data cleared from cloud!")
                         st.rerun()
                     else:
@@ -294,7 +518,7 @@ if section == "Admin (Upload/Index)":
             
             with col2:
                 if st.button("📊 View All Courses", type="secondary"):
-                    courses = list_all_courses()
+                    courses = _cached_list_all_courses()
                     if courses:
                         st.write("**Available courses:**")
                         for c in courses:
@@ -316,7 +540,7 @@ if section == "Admin (Upload/Index)":
         st.markdown("### 📋 Files to Process")
         total_size = 0
         for i, file in enumerate(ups, 1):
-            file_size = len(file.getvalue()) / 1024  # KB
+            file_size = file.size / 1024  # KB, without materializing the bytes
             total_size += file_size
             st.info(f"📄 **{i}.** {file.name} ({file_size:.1f} KB)")
         
@@ -329,18 +553,15 @@ if section == "Admin (Upload/Index)":
                 progress_bar = st.progress(0)
                 status_text = st.empty()
                 
+                def report_progress(done: int, total: int):
+                    status_text.text(f"🤖 Creating embeddings... ({done}/{total} chunks)")
+                    progress_bar.progress(int(100 * done / total))
+                
                 try:
-                    status_text.text("⚙️ Processing files...")
-                    progress_bar.progress(20)
-                    
                     status_text.text("🔍 Extracting text...")
-                    progress_bar.progress(40)
-                    
-                    status_text.text("🤖 Creating embeddings...")
-                    progress_bar.progress(60)
                     
-                    added = save_upload_and_index(course, ups)
-                    progress_bar.progress(80)
+                    added, total = save_upload_and_index(course, ups, progress_cb=report_progress)
+                    _invalidate_course_caches()
                     
                     status_text.text("✅ Finalizing...")
                     progress_bar.progress(100)
@@ -351,8 +572,10 @@ if section == "Admin (Upload/Index)":
                         st.info("✅ You can now use Chat, Quiz, Summary, and Interview modes.")
                         
                         # Show updated status
-                        status = check_course_status(course)
-                        st.metric("📚 Documents Indexed", status['document_count'])
+                        st.metric("📚 Documents Indexed", total)
+                    elif total > 0:
+                        st.info("✅ These files are already indexed - nothing new to add.")
+                        st.metric("📚 Documents Indexed", total)
                     else:
                         st.error("❌ No content was indexed. Please check your files.")
                         
@@ -409,130 +632,7 @@ elif section == "Chat":
         st.warning("⚠️ No course materials found. Please upload files in the Setup section first.")
         st.stop()
     
-    # Simple controls
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        if st.button("🧹 Clear Chat"):
-            st.session_state.chat_messages = []
-            st.session_state.last_sources = []
-            st.rerun()
-    
-    with col2:
-        show_sources = st.checkbox("📚 Show Sources", value=True)
-    
-    with col3:
-        st.caption(f"⚡ {status['document_count']} docs ready")
-    
-    # Chat history
-    for m in st.session_state.chat_messages:
-        with st.chat_message(m["role"]):
-            st.markdown(m["content"])
-    
-    # Chat input
-    user_input = st.chat_input("Ask a question about this course...")
-    
-    # Handle sidebar quick actions
-    if hasattr(st.session_state, 'suggested_question') and st.session_state.suggested_question:
-        user_input = st.session_state.suggested_question
-        del st.session_state.suggested_question
-    
-    if user_input:
-        # Add user message
-        add_chat_message("user", user_input)
-        
-        with st.chat_message("user"):
-            st.markdown(user_input)
-        
-        # Get context with performance timing
-        start_time = st.empty()
-        with st.spinner("🔍 Searching notes..."):
-            import time
-            start = time.time()
-            context_text, docs = build_context_block(course, user_input, k=5)
-            search_time = time.time() - start
-        
-        with st.chat_message("assistant"):
-            placeholder = st.empty()
-            streamed_text = ""
-            
-            if not context_text.strip():
-                streamed_text = "I don't find this in the class notes."
-                placeholder.markdown(streamed_text)
-                add_chat_message("assistant", streamed_text)
-                st.session_state.last_sources = []
-            else:
-                # Build system message with context
-                sys_msg = f"{SYSTEM_PROMPT}\n\nCONTEXT:\n{context_text}"
-                sys = SystemMessage(content=sys_msg)
-                
-                # Build conversation history (last 8 messages)
-                history_msgs = []
-                for m in st.session_state.chat_messages[-8:]:
-                    if m["role"] == "user":
-                        history_msgs.append(HumanMessage(content=m["content"]))
-                    elif m["role"] == "assistant":
-                        history_msgs.append(AIMessage(content=m["content"]))
-                
-                lc_messages = [sys, *history_msgs, HumanMessage(content=user_input)]
-                llm = ChatGroq(model=os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"), temperature=0.3)
-                
-                try:
-                    # Stream response
-                    for chunk in llm.stream(lc_messages):
-                        chunk_content = chunk.content or ""
-                        streamed_text += chunk_content
-                        placeholder.markdown(streamed_text + "▌")
-                    
-                    placeholder.markdown(streamed_text)
-                    
-                except Exception as e:
-                    # Fallback to non-streaming
-                    try:
-                        resp = llm.invoke(lc_messages)
-                        streamed_text = (resp.content or "").strip()
-                        placeholder.markdown(streamed_text)
-                    except:
-                        streamed_text = "Sorry, I'm having trouble connecting. Please try again."
-                        placeholder.markdown(streamed_text)
-                
-                add_chat_message("assistant", streamed_text)
-                st.session_state.last_sources = [d.metadata.get("source", "Unknown") for d in docs]
-        
-        # Show sources if enabled
-        if show_sources and st.session_state.last_sources:
-            with st.expander(f"📚 Sources ({len(st.session_state.last_sources)} documents) - Search took {search_time:.2f}s"):
-                for source in st.session_state.last_sources:
-                    st.caption(f"• {source}")
-        
-        # Performance info for debugging
-        if st.checkbox("🔧 Show Performance Info", key="perf_debug"):
-            st.caption(f"Search time: {search_time:.2f}s | Context length: {len(context_text)} chars")
-    
-    # Welcome message for new users
-    if not st.session_state.chat_messages:
-        st.info("👋 Welcome! Ask me anything about your course materials. I'll search through your uploaded notes to help answer your questions.")
-        
-        # Simple starter questions
-        st.markdown("**💡 Try asking:**")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button("📖 What are the main topics?", use_container_width=True):
-                st.session_state.suggested_question = "What are the main topics in my notes?"
-                st.rerun()
-            
-            if st.button("🎯 Key concepts to remember?", use_container_width=True):
-                st.session_state.suggested_question = "What are the key concepts I should remember?"
-                st.rerun()
-        
-        with col2:
-            if st.button("📝 Create a study plan", use_container_width=True):
-                st.session_state.suggested_question = "Can you create a study plan for me?"
-                st.rerun()
-            
-            if st.button("🤔 What might be challenging?", use_container_width=True):
-                st.session_state.suggested_question = "What topics might be challenging to understand?"
-                st.rerun()
+    _chat_fragment(course, status["document_count"])
 
 elif section == "Quiz":
     st.subheader("📝 Generate a Quiz from Your Notes")
@@ -565,13 +665,13 @@ elif section == "Quiz":
         st.session_state.user_answers = {}
     
     # Handle quick quiz request
-    if hasattr(st.session_state, 'quick_quiz_requested') and st.session_state.quick_quiz_requested:
-        del st.session_state.quick_quiz_requested
+    quick_quiz = st.session_state.pop('quick_quiz_requested', False)
+    if quick_quiz:
         topic = "Core concepts"
         num_q = 5
     
     # Generate quiz button
-    if st.button("🎯 Generate Quiz", type="primary") or hasattr(st.session_state, 'quick_quiz_requested'):
+    if st.button("🎯 Generate Quiz", type="primary") or quick_quiz:
         with st.spinner("🔍 Retrieving notes and generating quiz..."):
             ctx, *_ = build_context_block(course, topic)
             
@@ -580,6 +680,7 @@ elif section == "Quiz":
             else:
                 # Generate quiz with retry logic
                 with st.spinner("🤖 Creating questions..."):
+                    from generators import quiz_from_context
                     qs = quiz_from_context(context=ctx, count=num_q, topic=topic)
                     
                 if not qs or len(qs) == 0:
@@ -610,22 +711,9 @@ elif section == "Quiz":
                 # Handle options with better formatting
                 options = q.get("options", [f"A) Option {j}" for j in range(1, 5)])
                 labels = ["A", "B", "C", "D"]
-                clean_options = []
                 
                 # Clean option text
-                for j, opt in enumerate(options):
-                    if isinstance(opt, str):
-                        # Remove A), B), etc. prefixes if present
-                        if opt.strip().startswith(f"{labels[j]})"):
-                            clean_text = opt.split(")", 1)[1].strip()
-                        elif ")" in opt[:3]:
-                            clean_text = opt.split(")", 1)[1].strip()
-                        else:
-                            clean_text = opt.strip()
-                    else:
-                        clean_text = str(opt)
-                    
-                    clean_options.append(f"{labels[j]}) {clean_text}")
+                clean_options = [clean_option(labels[j], str(opt)) for j, opt in enumerate(options)]
                 
                 # Display options as radio buttons
                 choice = st.radio(
@@ -708,17 +796,14 @@ elif section == "Quiz":
                     for j, opt in enumerate(options):
                         label = labels[j]
                         # Clean option text
-                        if isinstance(opt, str) and ")" in opt[:3]:
-                            clean_text = opt.split(")", 1)[1].strip()
-                        else:
-                            clean_text = str(opt)
+                        option_text = clean_option(label, str(opt))
                         
                         if label == result['correct_answer']:
-                            st.success(f"✅ {label}) {clean_text} **(Correct Answer)**")
+                            st.success(f"✅ {option_text} **(Correct Answer)**")
                         elif label == result['user_answer']:
-                            st.error(f"❌ {label}) {clean_text} **(Your Answer)**")
+                            st.error(f"❌ {option_text} **(Your Answer)**")
                         else:
-                            st.write(f"◯ {label}) {clean_text}")
+                            st.write(f"◯ {option_text}")
                 
                 st.markdown("---")
             
@@ -774,9 +859,16 @@ elif section == "Quiz":
                 ctx, *_ = build_context_block(course, "")  # Get all content
                 if ctx.strip():
                     # Extract some key terms as suggested topics
-                    import re
-                    words = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', ctx)
-                    common_topics = list(set(words))[:10]
+                    # Stream matches and stop at 10 unique topics, keeping first-seen order
+                    common_topics = []
+                    seen_topics = set()
+                    for match in TOPIC_RE.finditer(ctx):
+                        word = match.group(0)
+                        if word not in seen_topics:
+                            seen_topics.add(word)
+                            common_topics.append(word)
+                            if len(common_topics) == 10:
+                                break
                     if common_topics:
                         st.write("**Suggested topics based on your notes:**")
                         st.write(", ".join(common_topics))
@@ -799,17 +891,18 @@ elif section == "Summary":
         st.caption(f"⚡ {status['document_count']} docs available")
     
     # Handle full summary request
-    if hasattr(st.session_state, 'full_summary_requested') and st.session_state.full_summary_requested:
-        del st.session_state.full_summary_requested
+    full_summary = st.session_state.pop('full_summary_requested', False)
+    if full_summary:
         topic = "Overview"
     
-    if st.button("📊 Generate Summary", type="primary") or hasattr(st.session_state, 'full_summary_requested'):
+    if st.button("📊 Generate Summary", type="primary") or full_summary:
         with st.spinner("🔍 Retrieving notes…"):
             ctx, _ = build_context_block(course, topic)
         if not ctx.strip():
             st.warning("⚠️ No relevant notes found. Upload files first or try a different topic.")
         else:
             with st.spinner("📝 Creating summary..."):
+                from generators import summary_from_context
                 s = summary_from_context(ctx, topic=topic)
             
             st.markdown("---")
@@ -845,6 +938,7 @@ elif section == "Interview Qs":
             st.warning("⚠️ No relevant notes found. Upload files first or try a different topic.")
         else:
             with st.spinner("🤖 Creating interview questions..."):
+                from generators import interview_qs_from_context
                 qa = interview_qs_from_context(ctx, topic, count=count)
             
             st.markdown("---")
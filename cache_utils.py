@@ -2,42 +2,71 @@
 Cache utilities and performance monitoring for the AI Study Companion
 """
 import time
+import threading
 import streamlit as st
-import psutil
 import os
-from typing import Dict, Any, Optional
-from functools import wraps
+from sys import getsizeof
+from typing import Dict, Any, Hashable, Optional
+from functools import cache, wraps
+from collections import OrderedDict
 import pickle
 import hashlib
 
+@cache
+def _get_psutil():
+    """Import psutil on first use so non-monitoring callers don't pay for it"""
+    import psutil
+    # Prime the CPU counter so the first non-blocking cpu_percent() reading is meaningful
+    psutil.cpu_percent(interval=None)
+    return psutil
+
+@cache
+def _process():
+    """Reused process handle - psutil.Process() re-opens /proc entries on every construction"""
+    return _get_psutil().Process()
+
 class PerformanceMonitor:
     """Monitor and track performance metrics"""
     
     def __init__(self):
         self.metrics = {}
         self.start_times = {}
+        self._lock = threading.Lock()
     
     def start_timer(self, operation: str):
         """Start timing an operation"""
-        self.start_times[operation] = time.time()
+        with self._lock:
+            self.start_times[operation] = time.time()
     
     def end_timer(self, operation: str) -> float:
         """End timing and return duration"""
-        if operation in self.start_times:
-            duration = time.time() - self.start_times[operation]
+        with self._lock:
+            start = self.start_times.pop(operation, None)
+        if start is None:
+            return 0.0
+        duration = time.time() - start
+        self.record(operation, duration)
+        return duration
+    
+    def record(self, operation: str, duration: float):
+        """Store a duration measured by the caller - safe to call from any session or thread"""
+        with self._lock:
             self.metrics[operation] = duration
-            del self.start_times[operation]
-            return duration
-        return 0.0
+    
+    def snapshot(self) -> Dict[str, float]:
+        """Consistent copy of the latest duration per operation"""
+        with self._lock:
+            return dict(self.metrics)
     
     def get_system_stats(self) -> Dict[str, Any]:
         """Get current system performance stats"""
         try:
+            psutil = _get_psutil()
             return {
-                "cpu_percent": psutil.cpu_percent(),
+                "cpu_percent": psutil.cpu_percent(interval=None),
                 "memory_percent": psutil.virtual_memory().percent,
                 "available_memory_gb": psutil.virtual_memory().available / (1024**3),
-                "process_memory_mb": psutil.Process().memory_info().rss / (1024**2)
+                "process_memory_mb": _process().memory_info().rss / (1024**2)
             }
         except:
             return {"error": "Unable to get system stats"}
@@ -47,8 +76,8 @@ class PerformanceMonitor:
         cache_info = {
             "streamlit_cache_size": 0,
             "session_state_size": len(st.session_state),
-            "cached_operations": list(self.metrics.keys()),
-            "last_operation_times": self.metrics
+            "cached_operations": list(self.snapshot()),
+            "last_operation_times": self.snapshot()
         }
         
         # Try to get streamlit cache info
@@ -68,71 +97,84 @@ class SmartCache:
     def __init__(self, max_size: int = 100, default_ttl: int = 300):
         self.max_size = max_size
         self.default_ttl = default_ttl
-        self.cache = {}
-        self.access_times = {}
-        self.creation_times = {}
+        # key -> (value, creation_time), ordered from least to most recently used
+        self.cache = OrderedDict()
     
-    def _generate_key(self, func_name: str, args: tuple, kwargs: dict) -> str:
-        """Generate a cache key from function name and arguments"""
-        key_data = (func_name, args, sorted(kwargs.items()))
-        key_string = str(key_data)
-        return hashlib.md5(key_string.encode()).hexdigest()
+    def _generate_key(self, func_name: str, args: tuple, kwargs: dict) -> tuple:
+        """Generate a cache key from function name and arguments
+
+        Hashable arguments are used as-is in a tuple key (the dict hashes them
+        in C), alongside their types so f(1), f(1.0) and f(True) get separate
+        entries. Unhashable ones such as lists or dicts are pickled and digested
+        instead. The function name always comes
+        first so one function's entries can be cleared.
+        """
+        kwargs_items = tuple(sorted(kwargs.items()))
+        types = (tuple(map(type, args)), tuple(type(v) for _, v in kwargs_items))
+        key = (func_name, args, kwargs_items, types)
+        try:
+            hash(key)
+            return key
+        except TypeError:
+            pass
+        
+        try:
+            key_bytes = pickle.dumps(key, protocol=5)
+        except Exception:
+            # Unpicklable arguments fall back to their repr
+            key_bytes = str(key).encode("utf-8")
+        return (func_name, hashlib.blake2b(key_bytes, digest_size=16).digest())
     
-    def _is_expired(self, key: str, ttl: Optional[int] = None) -> bool:
+    def _is_expired(self, key: Hashable, ttl: Optional[int] = None) -> bool:
         """Check if a cache entry has expired"""
-        if key not in self.creation_times:
+        if key not in self.cache:
             return True
         
-        age = time.time() - self.creation_times[key]
+        age = time.time() - self.cache[key][1]
         max_age = ttl if ttl is not None else self.default_ttl
         return age > max_age
     
-    def _evict_lru(self):
-        """Remove least recently used item"""
-        if not self.access_times:
-            return
-        
-        lru_key = min(self.access_times.keys(), 
-                     key=lambda k: self.access_times[k])
-        self._remove_key(lru_key)
-    
-    def _remove_key(self, key: str):
-        """Remove a key from all cache structures"""
+    def _remove_key(self, key: Hashable):
+        """Remove a key from the cache"""
         self.cache.pop(key, None)
-        self.access_times.pop(key, None)
-        self.creation_times.pop(key, None)
     
-    def get(self, key: str, ttl: Optional[int] = None):
+    def get(self, key: Hashable, ttl: Optional[int] = None):
         """Get an item from cache"""
-        if key in self.cache and not self._is_expired(key, ttl):
-            self.access_times[key] = time.time()
-            return self.cache[key]
-        elif key in self.cache:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        
+        value, created = entry
+        if time.time() - created > (ttl if ttl is not None else self.default_ttl):
             # Expired, remove it
-            self._remove_key(key)
-        return None
+            del self.cache[key]
+            return None
+        
+        self.cache.move_to_end(key)
+        return value
     
-    def set(self, key: str, value: Any):
+    def set(self, key: Hashable, value: Any):
         """Set an item in cache"""
-        # Manage cache size
-        while len(self.cache) >= self.max_size:
-            self._evict_lru()
+        self.cache[key] = (value, time.time())
+        self.cache.move_to_end(key)
         
-        current_time = time.time()
-        self.cache[key] = value
-        self.access_times[key] = current_time
-        self.creation_times[key] = current_time
+        # Manage cache size - evict least recently used
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
     
-    def clear(self):
-        """Clear all cache"""
-        self.cache.clear()
-        self.access_times.clear()
-        self.creation_times.clear()
+    def clear(self, namespace: Optional[str] = None):
+        """Clear all cache, or only the entries generated for one function name"""
+        if namespace is None:
+            self.cache.clear()
+            return
+        
+        for key in [k for k in self.cache if k[0] == namespace]:
+            del self.cache[key]
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         current_time = time.time()
-        expired_count = sum(1 for key in self.creation_times.keys() 
+        expired_count = sum(1 for key in self.cache.keys() 
                           if self._is_expired(key))
         
         return {
@@ -140,32 +182,51 @@ class SmartCache:
             "expired_items": expired_count,
             "max_size": self.max_size,
             "cache_hit_potential": len(self.cache) - expired_count,
-            "memory_usage_estimate": sum(len(str(v)) for v in self.cache.values())
+            "memory_usage_estimate": self._estimate_memory()
         }
+    
+    def _estimate_memory(self) -> int:
+        """Approximate bytes held by cached values without copying them"""
+        values = [v for v, _ in self.cache.values()]
+        if not values:
+            return 0
+        
+        # getsizeof is shallow for containers (e.g. quiz payloads), so extrapolate
+        # from one stringified sample instead of stringifying everything
+        sample = next((v for v in values if isinstance(v, (list, tuple, dict))), None)
+        if sample is not None:
+            return len(str(sample)) * len(values)
+        return sum(getsizeof(v) for v in values)
+
+# One cache shared by every @cache_with_ttl function, giving a single memory ceiling
+_SHARED_CACHE = SmartCache(max_size=512)
+
+# Process-wide monitor so timing a call never touches st.session_state
+_MONITOR = PerformanceMonitor()
 
 def cache_with_ttl(ttl: int = 300):
     """Decorator for caching function results with TTL"""
     def decorator(func):
-        cache = SmartCache(default_ttl=ttl)
+        namespace = f"{func.__module__}.{func.__qualname__}"
         
         @wraps(func)
         def wrapper(*args, **kwargs):
-            key = cache._generate_key(func.__name__, args, kwargs)
+            key = _SHARED_CACHE._generate_key(namespace, args, kwargs)
             
             # Try to get from cache
-            result = cache.get(key, ttl)
+            result = _SHARED_CACHE.get(key, ttl)
             if result is not None:
                 return result
             
             # Execute function and cache result
             result = func(*args, **kwargs)
-            cache.set(key, result)
+            _SHARED_CACHE.set(key, result)
             return result
         
         # Add cache management methods
-        wrapper.cache_clear = cache.clear
-        wrapper.cache_stats = cache.get_stats
-        wrapper._cache = cache
+        wrapper.cache_clear = lambda: _SHARED_CACHE.clear(namespace)
+        wrapper.cache_stats = _SHARED_CACHE.get_stats
+        wrapper._cache = _SHARED_CACHE
         
         return wrapper
     return decorator
@@ -177,19 +238,13 @@ def performance_timer(operation_name: str = None):
         def wrapper(*args, **kwargs):
             name = operation_name or func.__name__
             
-            if 'performance_monitor' not in st.session_state:
-                st.session_state.performance_monitor = PerformanceMonitor()
-            
-            monitor = st.session_state.performance_monitor
-            monitor.start_timer(name)
-            
+            # Timed locally - _MONITOR is shared by every session, so only the
+            # finished measurement is written to it. Surfaced by create_performance_dashboard.
+            start = time.perf_counter()
             try:
-                result = func(*args, **kwargs)
-                return result
+                return func(*args, **kwargs)
             finally:
-                duration = monitor.end_timer(name)
-                if st.checkbox("Show Performance Debug", key=f"perf_{name}"):
-                    st.caption(f"⏱️ {name}: {duration:.3f}s")
+                _MONITOR.record(name, time.perf_counter() - start)
         
         return wrapper
     return decorator
@@ -201,15 +256,15 @@ def memory_efficient_operation(max_memory_mb: int = 500):
         def wrapper(*args, **kwargs):
             # Check memory before operation
             try:
-                process = psutil.Process()
-                memory_before = process.memory_info().rss / (1024**2)
+                memory_info = _process().memory_info
+                memory_before = memory_info().rss / (1024**2)
                 
                 if memory_before > max_memory_mb:
                     st.warning(f"⚠️ High memory usage: {memory_before:.1f}MB")
                 
                 result = func(*args, **kwargs)
                 
-                memory_after = process.memory_info().rss / (1024**2)
+                memory_after = memory_info().rss / (1024**2)
                 memory_diff = memory_after - memory_before
                 
                 if memory_diff > 50:  # More than 50MB increase
@@ -226,10 +281,7 @@ def memory_efficient_operation(max_memory_mb: int = 500):
 
 def create_performance_dashboard():
     """Create a performance monitoring dashboard"""
-    if 'performance_monitor' not in st.session_state:
-        st.session_state.performance_monitor = PerformanceMonitor()
-    
-    monitor = st.session_state.performance_monitor
+    monitor = _MONITOR
     
     with st.expander("🔧 Performance Dashboard", expanded=False):
         col1, col2 = st.columns(2)
@@ -251,10 +303,13 @@ def create_performance_dashboard():
             
             st.metric("Session State Items", cache_stats['session_state_size'])
             
-            if cache_stats['last_operation_times']:
+            times = cache_stats['last_operation_times']
+            if times:
                 st.markdown("**Recent Operations:**")
-                for op, duration in cache_stats['last_operation_times'].items():
-                    st.caption(f"• {op}: {duration:.3f}s")
+                st.dataframe(
+                    {"operation": list(times), "seconds": list(times.values())},
+                    hide_index=True,
+                )
         
         # Cache management buttons
         st.markdown("**Cache Management**")
@@ -272,8 +327,7 @@ def create_performance_dashboard():
         
         with col3:
             if st.button("🔄 Reset Session"):
-                for key in list(st.session_state.keys()):
-                    del st.session_state[key]
+                st.session_state.clear()
                 st.success("Session reset!")
                 st.rerun()
 
@@ -287,6 +341,11 @@ class Timer:
         self.end_time = None
     
     def __enter__(self):
+        # Grab the plain dict once; outside a Streamlit session, times stay local
+        if st.runtime.exists():
+            self._store = st.session_state.setdefault('operation_times', {})
+        else:
+            self._store = {}
         self.start_time = time.time()
         return self
     
@@ -294,34 +353,33 @@ class Timer:
         self.end_time = time.time()
         self.duration = self.end_time - self.start_time
         
-        # Store in session state for monitoring
-        if 'operation_times' not in st.session_state:
-            st.session_state.operation_times = {}
-        
-        st.session_state.operation_times[self.operation_name] = self.duration
+        # Store for monitoring - a plain dict write, no session_state machinery
+        self._store[self.operation_name] = self.duration
 
 # Utility functions for cache warming
 def warm_up_caches(course_name: str):
-    """Pre-load commonly used data into cache"""
+    """Pre-load commonly used data into cache
+
+    Common queries go through _get_relevant_documents with TOP_K - the same
+    cache key the chat's context builder reads - after one batched encode
+    fills the query-embedding cache.
+    """
     try:
-        from rag_chain import check_course_status, _get_relevant_documents
+        from rag_chain import check_course_status, embed_queries, _get_relevant_documents, TOP_K
         
         with Timer("cache_warmup"):
             # Check course status (this loads vectorstore)
             status = check_course_status(course_name)
             
             if status["is_ready"]:
-                # Pre-load some common queries
                 common_queries = [
                     "overview", "main concepts", "important topics",
                     "key points", "summary"
                 ]
                 
+                embed_queries(common_queries)
                 for query in common_queries:
-                    try:
-                        _get_relevant_documents(course_name, query, k=3)
-                    except:
-                        pass  # Continue with other queries
+                    _get_relevant_documents(course_name, query, TOP_K)
         
         st.success("🚀 Caches warmed up successfully!")
         
@@ -1,4 +1,6 @@
 import os, json, re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_core.output_parsers import StrOutputParser
@@ -10,63 +12,122 @@ from prompts import (
     QUIZ_JSON_PROMPT,
 )
 
+try:
+    import orjson
+    _json_loads = orjson.loads  # orjson.JSONDecodeError subclasses json.JSONDecodeError
+except ImportError:
+    _json_loads = json.loads
+
 load_dotenv()
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+# Race quiz retries concurrently instead of sequentially (spends extra tokens)
+QUIZ_PARALLEL_ATTEMPTS = os.getenv("QUIZ_PARALLEL_ATTEMPTS", "false").lower() == "true"
+
+# Patterns for parse_structured_quiz_text
+_QBLOCK_RE = re.compile(r'\n*(?:Question\s*\d+|Q\d+|^\d+\.)', re.MULTILINE)
+_OPT_RE = re.compile(r'^[A-D]\)\s*(.+)', re.IGNORECASE)
+_ANS_RE = re.compile(r'answer[:\s]*([A-D])', re.IGNORECASE)
+# Markdown code fences the model sometimes wraps JSON in
+_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$', re.MULTILINE)
+
+_PROMPTS = {
+    "rag": RAG_ANSWER_PROMPT,
+    "summary": SUMMARY_PROMPT,
+    "interview": INTERVIEW_QS_PROMPT,
+    "quiz": QUIZ_JSON_PROMPT,
+}
 
+@lru_cache(maxsize=None)
 def _chat(temp: float = 0.2) -> ChatGroq:
-    # ChatGroq reads GROQ_API_KEY from env
+    # ChatGroq reads GROQ_API_KEY from env; one client per temperature keeps its connection pool warm
     return ChatGroq(model=GROQ_MODEL, temperature=temp)
 
+@lru_cache(maxsize=None)
+def _chain(name: str, temp: float = 0.2):
+    """Prompt | model | parser chain, built on first use and reused afterwards"""
+    return _PROMPTS[name] | _chat(temp) | StrOutputParser()
+
 def rag_answer(question: str, context: str) -> str:
-    chain = RAG_ANSWER_PROMPT | _chat(0.2) | StrOutputParser()
-    return chain.invoke({"context": context, "question": question}).strip()
+    return _chain("rag", 0.2).invoke({"context": context, "question": question}).strip()
 
 def summary_from_context(context: str, topic:str) -> str:
-    chain = SUMMARY_PROMPT | _chat(0.2) | StrOutputParser()
-    return chain.invoke({"context": context, "topic":topic}).strip()
+    return _chain("summary", 0.2).invoke({"context": context, "topic":topic}).strip()
 
 def interview_qs_from_context(context: str,topic:str ,count: int = 10) -> str:
-    chain = INTERVIEW_QS_PROMPT | _chat(0.2) | StrOutputParser()
-    return chain.invoke({"context": context, "count": count, "topic":topic}).strip()
+    return _chain("interview", 0.2).invoke({"context": context, "count": count, "topic":topic}).strip()
+
+_QUESTION_KEYS = frozenset(('question', 'options', 'answer'))
 
-def quiz_from_context(context: str,topic: str ,count: int = 5, max_retries: int = 3):
+def _is_valid_question(item) -> bool:
+    return (isinstance(item, dict) and
+            item.keys() >= _QUESTION_KEYS and
+            isinstance(item['options'], list) and
+            len(item['options']) == 4)
+
+def _quiz_attempt(context: str, topic: str, count: int) -> list:
+    """One quiz generation + parse attempt; returns [] if nothing usable came back"""
+    # Use higher temperature for more creativity in options
+    raw = _chain("quiz", 0.3).invoke({"context": context, "count": count,"topic":topic}).strip()
+    
+    # Clean the response - remove any markdown formatting
+    raw = _FENCE_RE.sub("", raw).strip()
+    
+    # Try to parse as JSON first
+    try:
+        data = _json_loads(raw)
+        if isinstance(data, list) and len(data) > 0:
+            # Validate that each question has proper structure
+            head = data[:count]
+            if all(map(_is_valid_question, head)):
+                return head
+            
+            valid_questions = [item for item in head if _is_valid_question(item)]
+            if valid_questions:
+                return valid_questions
+                
+    except json.JSONDecodeError:
+        pass
+    
+    # If JSON parsing fails, try structured text parsing
+    return parse_structured_quiz_text(raw, count)
+
+def _quiz_race(context: str, topic: str, count: int, attempts: int) -> list:
+    """Run attempts concurrently and return the first usable result"""
+    pool = ThreadPoolExecutor(max_workers=attempts)
+    try:
+        futures = [pool.submit(_quiz_attempt, context, topic, count) for _ in range(attempts)]
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                questions = future.result()
+            except Exception as e:
+                print(f"Attempt {i} failed: {e}")
+                continue
+            if questions:
+                return questions
+        return []
+    finally:
+        # Don't wait on the losers; their responses are discarded
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def quiz_from_context(context: str,topic: str ,count: int = 5, max_retries: int = 3, parallel: bool = None):
     """
     Generate quiz questions with improved error handling and JSON parsing
+
+    With parallel=True (default: QUIZ_PARALLEL_ATTEMPTS env var) all attempts
+    are sent at once and the first valid one wins, trading extra tokens for
+    lower tail latency.
     """
+    if parallel is None:
+        parallel = QUIZ_PARALLEL_ATTEMPTS
+    
+    if parallel and max_retries > 1:
+        return _quiz_race(context, topic, count, max_retries) or generate_fallback_quiz(context, count)
+    
     for attempt in range(max_retries):
         try:
-            # Use higher temperature for more creativity in options
-            chain = QUIZ_JSON_PROMPT | _chat(0.3) | StrOutputParser()
-            raw = chain.invoke({"context": context, "count": count,"topic":topic}).strip()
-            
-            # Clean the response - remove any markdown formatting
-            raw = raw.replace("```json", "").replace("```", "").strip()
-            
-            # Try to parse as JSON first
-            try:
-                data = json.loads(raw)
-                if isinstance(data, list) and len(data) > 0:
-                    # Validate that each question has proper structure
-                    valid_questions = []
-                    for item in data[:count]:
-                        if (isinstance(item, dict) and 
-                            'question' in item and 
-                            'options' in item and 
-                            'answer' in item and
-                            isinstance(item['options'], list) and
-                            len(item['options']) == 4):
-                            valid_questions.append(item)
-                    
-                    if valid_questions:
-                        return valid_questions
-                        
-            except json.JSONDecodeError:
-                pass
-            
-            # If JSON parsing fails, try structured text parsing
-            parsed_questions = parse_structured_quiz_text(raw, count)
-            if parsed_questions:
-                return parsed_questions
+            questions = _quiz_attempt(context, topic, count)
+            if questions:
+                return questions
                 
         except Exception as e:
             print(f"Attempt {attempt + 1} failed: {e}")
@@ -83,7 +144,7 @@ def parse_structured_quiz_text(text: str, count: int) -> list:
     questions = []
     
     # Split by question patterns
-    question_blocks = re.split(r'\n*(?:Question\s*\d+|Q\d+|^\d+\.)', text, flags=re.MULTILINE)
+    question_blocks = _QBLOCK_RE.split(text)
     
     for block in question_blocks[1:]:  # Skip first empty block
         if not block.strip():
@@ -98,9 +159,8 @@ def parse_structured_quiz_text(text: str, count: int) -> list:
         answer = "A"
         
         # Extract options (looking for A), B), C), D) pattern)
-        option_pattern = re.compile(r'^[A-D]\)\s*(.+)', re.IGNORECASE)
         for line in lines[1:]:
-            match = option_pattern.match(line)
+            match = _OPT_RE.match(line)
             if match:
                 options.append(line)
                 if len(options) == 4:
@@ -108,7 +168,7 @@ def parse_structured_quiz_text(text: str, count: int) -> list:
         
         # Look for answer
         for line in lines:
-            answer_match = re.search(r'answer[:\s]*([A-D])', line, re.IGNORECASE)
+            answer_match = _ANS_RE.search(line)
             if answer_match:
                 answer = answer_match.group(1).upper()
                 break
@@ -125,12 +185,14 @@ def parse_structured_quiz_text(text: str, count: int) -> list:
     
     return questions[:count]
 
-def generate_fallback_quiz(context: str, count: int) -> list:
-    """
-    Generate basic quiz questions when parsing fails
-    """
+@lru_cache(maxsize=1)
+def _fallback_chain():
+    return _chat(0.4) | StrOutputParser()
+
+@lru_cache(maxsize=8)
+def _fallback_prompt(context_head: str, count: int) -> str:
     # Use a simpler prompt that's more likely to work
-    fallback_prompt = f"""
+    return f"""
     Create {count} multiple choice questions based on this context. 
     Use this EXACT format for each question:
     
@@ -141,12 +203,15 @@ def generate_fallback_quiz(context: str, count: int) -> list:
     D) [option D]
     Answer: [A/B/C/D]
     
-    Context: {context[:1000]}...
+    Context: {context_head}...
+    """
+
+def generate_fallback_quiz(context: str, count: int) -> list:
+    """
+    Generate basic quiz questions when parsing fails
     """
-    
     try:
-        chain = ChatGroq(model=GROQ_MODEL, temperature=0.4) | StrOutputParser()
-        result = chain.invoke(fallback_prompt)
+        result = _fallback_chain().invoke(_fallback_prompt(context[:1000], count))
         return parse_structured_quiz_text(result, count)
     except:
         # Ultimate fallback - return template questions
@@ -1,5 +1,9 @@
 from langchain_core.prompts import PromptTemplate
 
+# Every template keeps its instructions and output format first and the
+# per-request fields ({context}, {topic}, {count}, ...) last, so consecutive
+# calls share an identical prefix that providers with prefix caching can reuse.
+
 # RAG Answer Prompt - Enhanced for better tutoring
 RAG_ANSWER_PROMPT = PromptTemplate.from_template(
 """You are an expert educational tutor helping students understand course material.
@@ -11,6 +15,7 @@ INSTRUCTIONS:
 - Be encouraging and supportive in your tone
 - If the question requires problem-solving, guide the student through the process
 - Check for understanding by asking if clarification is needed
+- Be concise yet thorough, use step-by-step format when helpful
 
 COURSE NOTES:
 {context}
@@ -18,7 +23,7 @@ COURSE NOTES:
 STUDENT QUESTION:
 {question}
 
-TUTOR RESPONSE (be concise yet thorough, use step-by-step format when helpful):
+TUTOR RESPONSE:
 """
 )
 
@@ -34,10 +39,7 @@ INSTRUCTIONS:
 - Use bullet points and formatting for easy review
 - Prioritize the most important information for exam preparation
 
-TOPIC TO COVER:
-{topic}
-
-STUDY SHEET:
+FORMAT (fill in these sections):
 # Study Sheet
 
 ## Key Concepts & Definitions
@@ -48,6 +50,13 @@ STUDY SHEET:
 
 ## Key Points to Remember
 
+COURSE NOTES:
+{context}
+
+TOPIC TO COVER:
+{topic}
+
+STUDY SHEET:
 """
 )
 
@@ -56,21 +65,14 @@ INTERVIEW_QS_PROMPT = PromptTemplate.from_template(
 """You are an experienced educator creating interview/exam questions for students.
 
 INSTRUCTIONS:
-- Create exactly {count} questions with varying difficulty levels (easy, medium, hard)
+- Create exactly the number of questions requested below, with varying difficulty levels (easy, medium, hard)
 - Base questions on the course notes but use your pedagogical knowledge to create meaningful assessments
 - Include brief, clear ideal answers that demonstrate proper understanding
 - Questions should test comprehension, application, and analysis
 - Format each Q&A pair clearly with question numbers
 - Focus on the topic mentioned to ensure relevance and interview questions.
 
-COURSE NOTES (use as foundation):
-{context}
-
-TOPIC TO COVER:
-{topic}
-
-INTERVIEW/EXAM QUESTIONS:
-
+FORMAT:
 Question 1 (Easy):
 Q: 
 A: 
@@ -80,6 +82,17 @@ Q:
 A: 
 
 [Continue pattern based on count requested]
+
+COURSE NOTES (use as foundation):
+{context}
+
+TOPIC TO COVER:
+{topic}
+
+NUMBER OF QUESTIONS:
+{count}
+
+INTERVIEW/EXAM QUESTIONS:
 """
 )
 
@@ -88,7 +101,7 @@ QUIZ_JSON_PROMPT = PromptTemplate.from_template(
 """You are creating a multiple-choice quiz for students based on course material.
 
 INSTRUCTIONS:
-- Create exactly {count} multiple-choice questions
+- Create exactly the number of multiple-choice questions requested below
 - based on the topic provided generate the questions.
 - use the context provided just for your information.
 - Each question must have exactly 4 options labeled A, B, C, D
@@ -97,13 +110,7 @@ INSTRUCTIONS:
 - Return ONLY valid JSON - no additional text or formatting
 - Ensure JSON is properly formatted with correct syntax
 
-#context
-{context}
-
-# topic 
-{topic}
-
-JSON OUTPUT (return only the JSON array):
+FORMAT (a JSON array of objects like this):
 [
   {{
     "question": "Clear, specific question text?",
@@ -118,6 +125,17 @@ JSON OUTPUT (return only the JSON array):
     "explanation": "Brief explanation of why this answer is correct"
   }}
 ]
+
+#context
+{context}
+
+# topic 
+{topic}
+
+# number of questions
+{count}
+
+JSON OUTPUT (return only the JSON array):
 """
 )
 
@@ -1,23 +1,63 @@
-import os, re
+import os, re, platform, hashlib, shutil, sqlite3, threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List
+from typing import Callable, List, Optional, Tuple
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
+import numpy as np
 import streamlit as st
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from sentence_transformers import SentenceTransformer
 import chromadb
 
+from utils import read_pdf
+
 load_dotenv()
 
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1200"))
-CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+def _token_setting(name: str, legacy: str, default: int) -> int:
+    """Read a token-count setting, converting its old character-count variable if that's all that is set"""
+    if name in os.environ:
+        return int(os.environ[name])
+    if legacy in os.environ:
+        value = max(1, int(os.environ[legacy]) // 4)
+        print(f"{legacy} counts characters and is deprecated; using {name}={value} (~4 chars per token)")
+        return value
+    return default
+
+# Measured in embedding-model tokens; MiniLM truncates input past 256
+CHUNK_TOKENS = _token_setting("CHUNK_TOKENS", "CHUNK_SIZE", 200)
+CHUNK_OVERLAP_TOKENS = _token_setting("CHUNK_OVERLAP_TOKENS", "CHUNK_OVERLAP", 30)
 TOP_K = int(os.getenv("TOP_K", "5"))
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "256"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+# Uploads written to disk ahead of the file being parsed
+WRITE_AHEAD = 2
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_DISK_ROWS = int(os.getenv("QUERY_CACHE_DISK_ROWS", "50000"))
+CHUNK_CACHE_DISK_ROWS = int(os.getenv("CHUNK_CACHE_DISK_ROWS", "200000"))
+# Candidates taken from each of the dense and keyword rankings before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+RRF_K = 60
+
+# Embeddings are L2-normalized, so inner product ranks like cosine without the per-query norm
+_HNSW_METADATA = {
+    "hnsw:space": "ip",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 100,
+    "hnsw:search_ef": 64,
+}
 
 # Production embedding model - works anywhere without API keys
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "onnx-int8" runs a dynamically quantized ONNX Runtime export; "torch" keeps FP32
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx-int8").lower()
+# Identifies the vector space: vectors made under another tag must never be mixed in
+_EMBEDDING_TAG = f"{EMBEDDING_MODEL}|{EMBEDDING_BACKEND}"
 
 # ChromaDB Cloud Configuration
 CHROMADB_API_KEY = os.getenv("CHROMADB_API_KEY", "ck-4XSjjc5e1RobXcd9WNohEwKLCYc8AoE1a3jTTZAnpZcd")
@@ -32,42 +72,123 @@ FILES_ROOT = os.getenv("FILES_ROOT", "storage/files")
 def _ensure_dir(p: str) -> None:
     Path(p).mkdir(parents=True, exist_ok=True)
 
-if not USE_CLOUD_CHROMA:
-    _ensure_dir(PERSIST_ROOT)
+# Always created: local caches (query embeddings, ONNX export) live here even with cloud Chroma
+_ensure_dir(PERSIST_ROOT)
 _ensure_dir(FILES_ROOT)
 
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
 def _slugify(text: str) -> str:
-    text = text.strip().lower()
-    return re.sub(r"[^a-z0-9]+", "-", text).strip("-")
+    return _SLUG_RE.sub("-", text.strip().lower()).strip("-")
 
-def _split(text: str) -> List[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+@st.cache_resource(show_spinner=False)
+def _get_splitter() -> RecursiveCharacterTextSplitter:
+    """Splitter that sizes chunks with the embedding model's own tokenizer"""
+    from transformers import AutoTokenizer
+
+    return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        AutoTokenizer.from_pretrained(EMBEDDING_MODEL),
+        chunk_size=CHUNK_TOKENS,
+        chunk_overlap=CHUNK_OVERLAP_TOKENS,
     )
-    return splitter.split_text(text or "")
 
-def _read_pdf(path: str) -> str:
-    reader = PdfReader(path)
-    return "\n".join([(p.extract_text() or "") for p in reader.pages])
+def _split(text: str) -> List[str]:
+    return _get_splitter().split_text(text or "")
 
 def _read_txt(path: str) -> str:
     return Path(path).read_text(encoding="utf-8", errors="ignore")
 
+def _save_upload(f, dest: str) -> str:
+    """Stream an uploaded file to disk in 1 MiB chunks"""
+    with open(dest, "wb") as out:
+        shutil.copyfileobj(f, out, length=1 << 20)
+    return dest
+
+def _extract_texts(
+    uploaded_files,
+    dests: List[str],
+    on_saved: Optional[Callable[[int], None]] = None,
+) -> List[Optional[str]]:
+    """Save uploads to disk and extract their text, in order; None for unsupported types
+
+    A two-stage thread pipeline: two writer threads save the next files to
+    disk while this thread parses the ones already written, with at most
+    WRITE_AHEAD writes queued ahead of parsing. PDFs are parsed in-process -
+    PyMuPDF does the work in C, and a spawned process pool would re-run the
+    whole Streamlit script (Streamlit's __main__ is app.py) in every worker.
+    on_saved(i) is called on this thread as each file lands on disk.
+    """
+    jobs = iter(zip(uploaded_files, dests))
+    parsed = []
+    with ThreadPoolExecutor(max_workers=2) as io_pool:
+        writes = deque(io_pool.submit(_save_upload, f, dest) for f, dest in islice(jobs, WRITE_AHEAD))
+        while writes:
+            dest = writes.popleft().result()
+            # Keep the writers busy while this file is parsed
+            for f, next_dest in islice(jobs, 1):
+                writes.append(io_pool.submit(_save_upload, f, next_dest))
+            if on_saved:
+                on_saved(len(parsed))
+            if dest.lower().endswith(".pdf"):
+                parsed.append(read_pdf(dest))
+            elif dest.lower().endswith(".txt"):
+                parsed.append(_read_txt(dest))
+            else:
+                parsed.append(None)
+    return parsed
+
+class _SentenceEmbeddings(Embeddings):
+    """LangChain embeddings over a SentenceTransformer, exposing bulk numpy encoding"""
+
+    def __init__(self, model: SentenceTransformer):
+        self.model = model
+
+    def encode(self, texts: List[str], batch_size: int = 32):
+        """L2-normalized embeddings as a (len(texts), dim) float32 array"""
+        return self.model.encode(
+            list(texts),
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+def _load_int8_onnx_model() -> SentenceTransformer:
+    """Dynamically int8-quantized ONNX export of the embedding model, cached on disk"""
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    # VNNI kernels on x86, dot-product kernels on ARM
+    config = "arm64" if platform.machine().lower() in ("arm64", "aarch64") else "avx512_vnni"
+    file_name = f"onnx/model_qint8_{config}.onnx"
+    local_dir = os.path.join(PERSIST_ROOT, "onnx", _slugify(EMBEDDING_MODEL))
+
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        model = SentenceTransformer(EMBEDDING_MODEL, device='cpu', backend="onnx")
+        model.save(local_dir)
+        export_dynamic_quantized_onnx_model(model, config, local_dir)
+
+    return SentenceTransformer(
+        local_dir, device='cpu', backend="onnx", model_kwargs={"file_name": file_name}
+    )
+
 @st.cache_resource
 def _get_embeddings():
     """Get sentence transformer embeddings - cached for performance"""
+    if EMBEDDING_BACKEND == "onnx-int8":
+        try:
+            return _SentenceEmbeddings(_load_int8_onnx_model())
+        except Exception as e:
+            print(f"int8 ONNX embeddings unavailable, falling back to torch: {e}")
+
     try:
-        return HuggingFaceEmbeddings(
-            model_name=EMBEDDING_MODEL,
-            model_kwargs={
-                'device': 'cpu',
-                'trust_remote_code': False
-            },
-            encode_kwargs={
-                'normalize_embeddings': True,
-                'batch_size': 32
-            },
-            show_progress=False
+        return _SentenceEmbeddings(
+            SentenceTransformer(EMBEDDING_MODEL, device='cpu', trust_remote_code=False)
         )
     except Exception as e:
         st.error(f"Failed to load embedding model: {e}")
@@ -93,6 +214,190 @@ def _get_chromadb_client():
     else:
         return chromadb.PersistentClient(path=PERSIST_ROOT)
 
+class _EmbeddingCache:
+    """In-memory LRU of embeddings keyed by the text's SHA-256, backed by a sqlite table
+
+    Vectors are held as float32 arrays; callers convert to lists only where a
+    client needs them. With disk_max_rows set, the sqlite table keeps at most that
+    many rows and drops the oldest writes first; without it the table is unbounded.
+    """
+
+    def __init__(self, path: str, table: str, max_size: int, disk_max_rows: Optional[int] = None):
+        self.table = table
+        self.max_size = max_size
+        self.disk_max_rows = disk_max_rows
+        self._mem: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} (hash BLOB PRIMARY KEY, vec BLOB)")
+        self._db.commit()
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        # Vectors from another model or backend must never be served
+        return hashlib.sha256(f"{_EMBEDDING_TAG}|{text}".encode()).digest()
+
+    def _remember(self, key: bytes, vec: np.ndarray) -> None:
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        if len(self._mem) > self.max_size:
+            self._mem.popitem(last=False)
+
+    def get_many(self, texts: List[str], encode: Callable) -> np.ndarray:
+        """(len(texts), dim) float32 embeddings, running encode(missing_texts) only on cache misses"""
+        keys = [self._key(t) for t in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._mem:
+                    self._mem.move_to_end(key)
+                    found[key] = self._mem[key]
+            lookup = [k for k in dict.fromkeys(keys) if k not in found]
+            for key in lookup:
+                row = self._db.execute(f"SELECT vec FROM {self.table} WHERE hash = ?", (key,)).fetchone()
+                if row:
+                    found[key] = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, found[key])
+
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}
+        if missing:
+            vectors = np.asarray(encode(list(missing.values())), dtype=np.float32)
+            with self._lock:
+                for key, vec in zip(missing, vectors):
+                    # Copy so a cached row doesn't keep the whole batch array alive
+                    found[key] = vec.copy()
+                    self._remember(key, found[key])
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (hash, vec) VALUES (?, ?)",
+                    [(key, vec.tobytes()) for key, vec in zip(missing, vectors)],
+                )
+                if self.disk_max_rows is not None:
+                    # INSERT OR REPLACE hands out fresh rowids, so the lowest ones are the oldest writes
+                    self._db.execute(
+                        f"DELETE FROM {self.table} WHERE rowid <= (SELECT MAX(rowid) FROM {self.table}) - ?",
+                        (self.disk_max_rows,),
+                    )
+                self._db.commit()
+
+        return np.stack([found[k] for k in keys])
+
+    def get_or_compute(self, text: str, encode: Callable) -> np.ndarray:
+        return self.get_many([text], encode)[0]
+
+    def forget(self, texts) -> None:
+        """Drop the cached vectors of these texts from memory and disk"""
+        keys = [self._key(t) for t in texts]
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._mem.pop(key, None)
+            self._db.executemany(f"DELETE FROM {self.table} WHERE hash = ?", [(k,) for k in keys])
+            self._db.commit()
+
+@st.cache_resource
+def _get_query_cache() -> _EmbeddingCache:
+    return _EmbeddingCache(os.path.join(PERSIST_ROOT, "query_emb.sqlite"), "query_emb", QUERY_CACHE_SIZE, QUERY_CACHE_DISK_ROWS)
+
+@st.cache_resource
+def _get_chunk_cache() -> _EmbeddingCache:
+    # Chunks are looked up once per upload, so the sqlite table does the work, not the LRU.
+    # Removed chunks are forgotten as they go; the row cap catches anything missed.
+    return _EmbeddingCache(
+        os.path.join(PERSIST_ROOT, "emb_cache.sqlite"), "chunk_emb", 1024, CHUNK_CACHE_DISK_ROWS
+    )
+
+def embed_query(text: str) -> np.ndarray:
+    """Embed a search query - repeated queries skip the encoder, across sessions and restarts"""
+    return _get_query_cache().get_or_compute(text, _get_embeddings().encode)
+
+def embed_queries(texts: List[str]) -> np.ndarray:
+    """Embed several search queries, encoding only the ones not already cached"""
+    return _get_query_cache().get_many(list(texts), _get_embeddings().encode)
+
+_FTS_LOCK = threading.Lock()
+_FTS_TERM_RE = re.compile(r"\w+")
+
+@st.cache_resource
+def _get_fts_db():
+    """sqlite FTS5 keyword index over every indexed chunk, or None if FTS5 is unavailable"""
+    try:
+        db = sqlite3.connect(os.path.join(PERSIST_ROOT, "fts.db"), check_same_thread=False)
+        db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts "
+            "USING fts5(id UNINDEXED, course UNINDEXED, source UNINDEXED, content)"
+        )
+        db.commit()
+        return db
+    except sqlite3.Error as e:
+        print(f"FTS5 keyword index unavailable, using dense retrieval only: {e}")
+        return None
+
+def _fts_update(
+    collection_name: str, stale_ids: List[str], ids: List[str], texts: List[str], metas: List[dict]
+) -> None:
+    """Drop stale chunks from a course's rows in the keyword index and add any
+    of the given chunks it doesn't have yet
+
+    Rows are added by comparing with the index itself rather than with Chroma,
+    so chunks indexed before the keyword index existed, or after fts.db was
+    lost, get their rows back on the next upload of their file.
+    """
+    db = _get_fts_db()
+    if db is None:
+        return
+    with _FTS_LOCK:
+        db.executemany(
+            "DELETE FROM chunks_fts WHERE id = ? AND course = ?",
+            [(i, collection_name) for i in stale_ids],
+        )
+        present = {
+            row[0] for row in db.execute("SELECT id FROM chunks_fts WHERE course = ?", (collection_name,))
+        }
+        db.executemany(
+            "INSERT INTO chunks_fts (id, course, source, content) VALUES (?, ?, ?, ?)",
+            [
+                (i, collection_name, m.get("source", ""), t)
+                for i, t, m in zip(ids, texts, metas)
+                if i not in present
+            ],
+        )
+        db.commit()
+
+def _fts_clear(collection_name: str) -> None:
+    """Remove every row of a course from the keyword index"""
+    db = _get_fts_db()
+    if db is None:
+        return
+    with _FTS_LOCK:
+        db.execute("DELETE FROM chunks_fts WHERE course = ?", (collection_name,))
+        db.commit()
+
+def _fts_search(db, collection_name: str, query: str, limit: int) -> List[Tuple[str, Document]]:
+    """BM25-ranked (id, Document) pairs for chunks sharing any term with the query"""
+    terms = _FTS_TERM_RE.findall(query.lower())
+    if db is None or not terms:
+        return []
+    match = " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+    with _FTS_LOCK:
+        rows = db.execute(
+            "SELECT id, source, content FROM chunks_fts WHERE chunks_fts MATCH ? AND course = ? "
+            "ORDER BY bm25(chunks_fts) LIMIT ?",
+            (match, collection_name, limit),
+        ).fetchall()
+    return [
+        (i, Document(page_content=content, metadata={"source": source}))
+        for i, source, content in rows
+    ]
+
+def _rrf_fuse(rankings: List[List[str]], k: int) -> List[str]:
+    """Reciprocal-rank fusion of id rankings: score = sum of 1 / (RRF_K + rank)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
 def _get_collection_name(course_name: str) -> str:
     """Generate a safe collection name for ChromaDB"""
     course_slug = _slugify(course_name)
@@ -102,9 +407,27 @@ def _get_collection_name(course_name: str) -> str:
         collection_name = collection_name[:63]
     return collection_name
 
-@st.cache_resource
+# Per-course vector stores keyed by collection name (so every spelling of a
+# course shares one entry), kept apart from st.cache_resource so dropping one
+# course never evicts the embedding model or the ChromaDB client
+_VS_CACHE: dict = {}
+_VS_LOCK = threading.Lock()
+
 def _get_vectorstore(course_name: str):
-    """Get vector store for a course - cached for performance"""
+    """Get vector store for a course - cached until the course's data changes"""
+    collection_name = _get_collection_name(course_name)
+    with _VS_LOCK:
+        if collection_name in _VS_CACHE:
+            return _VS_CACHE[collection_name]
+    
+    vectorstore = _load_vectorstore(course_name)
+    # Empty results aren't cached, so a first upload shows up immediately
+    if vectorstore is not None:
+        with _VS_LOCK:
+            _VS_CACHE[collection_name] = vectorstore
+    return vectorstore
+
+def _load_vectorstore(course_name: str):
     try:
         client = _get_chromadb_client()
         collection_name = _get_collection_name(course_name)
@@ -120,12 +443,8 @@ def _get_vectorstore(course_name: str):
                 embedding_function=_get_embeddings(),
             )
             
-            # Test if collection has documents
-            try:
-                test_results = vectorstore.similarity_search("test", k=1)
-                return vectorstore if len(test_results) > 0 else None
-            except:
-                return None
+            # Metadata-only emptiness check - no embedding or ANN query
+            return vectorstore if collection.count() > 0 else None
                 
         except Exception:
             # Collection doesn't exist
@@ -135,88 +454,198 @@ def _get_vectorstore(course_name: str):
         st.error(f"Error accessing vector store: {e}")
         return None
 
+def _dense_search(collection, query: str, limit: int) -> List[str]:
+    """Embedding-ranked chunk ids - text is fetched later, only for the chunks kept"""
+    results = collection.query(
+        query_embeddings=[embed_query(query).tolist()],
+        n_results=limit,
+        include=["distances"],
+    )
+    return results["ids"][0]
+
+def _fetch_documents(collection, ids: List[str]) -> dict:
+    """id -> Document for the given chunk ids"""
+    if not ids:
+        return {}
+    results = collection.get(ids=ids, include=["documents", "metadatas"])
+    return {
+        i: Document(page_content=text, metadata=meta or {})
+        for i, text, meta in zip(results["ids"], results["documents"], results["metadatas"])
+    }
+
 @st.cache_data(ttl=300)
 def _get_relevant_documents(course_name: str, query: str, k: int = TOP_K):
-    """Cache document retrieval results"""
+    """Hybrid retrieval: dense and BM25 keyword rankings fused with RRF, cached"""
     vectorstore = _get_vectorstore(course_name)
     if vectorstore is None:
         return []
     
     try:
-        return vectorstore.similarity_search(query, k=k)
+        collection_name = _get_collection_name(course_name)
+        # The cached store already holds the collection handle - no metadata round-trip
+        collection = vectorstore._collection
+        limit = max(k, HYBRID_CANDIDATES)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            keyword = pool.submit(_fts_search, _get_fts_db(), collection_name, query, limit)
+            dense_ids = _dense_search(collection, query, limit)
+            keyword_docs = dict(keyword.result())
+        
+        top_ids = _rrf_fuse([dense_ids, list(keyword_docs)], k)
+        # Keyword hits already carry their text; only dense-only hits need a fetch
+        docs = _fetch_documents(collection, [i for i in top_ids if i not in keyword_docs])
+        docs.update(keyword_docs)
+        return [docs[i] for i in top_ids if i in docs]
     except Exception as e:
         st.error(f"Error retrieving documents: {e}")
         return []
 
-def save_upload_and_index(course_name: str, uploaded_files) -> int:
-    """Save uploaded PDFs/TXTs and index into ChromaDB Cloud"""
+def _open_course_collection(client, collection_name: str):
+    """Get or create a course collection, rebuilding it if it holds another model's vectors
+
+    The collection is kept across uploads so other files of the course stay
+    indexed; get_or_create is atomic, so concurrent first uploads can't race.
+    Collections record the embedding tag they were built with. On a mismatch
+    the old vectors can't be queried (possibly not even at the same dimension),
+    so the collection is dropped and its files must be re-uploaded.
+    Collections created before the tag was recorded are kept as they are.
+    """
+    def open_collection():
+        try:
+            return client.get_or_create_collection(
+                name=collection_name, metadata={**_HNSW_METADATA, "embedding": _EMBEDDING_TAG}
+            )
+        except Exception:
+            # Hosted indexes may not accept HNSW tuning
+            return client.get_or_create_collection(
+                name=collection_name, metadata={"embedding": _EMBEDDING_TAG}
+            )
+
+    collection = open_collection()
+    recorded = (collection.metadata or {}).get("embedding")
+    if recorded is not None and recorded != _EMBEDDING_TAG:
+        st.warning(
+            f"⚠️ This course was indexed with {recorded}; rebuilding it for {_EMBEDDING_TAG}. "
+            "Re-upload the course's other files to index them again."
+        )
+        client.delete_collection(name=collection_name)
+        _fts_clear(collection_name)
+        collection = open_collection()
+    return collection
+
+def save_upload_and_index(
+    course_name: str,
+    uploaded_files,
+    progress_cb: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[int, int]:
+    """Save uploaded PDFs/TXTs and index into ChromaDB Cloud
+
+    progress_cb, if given, is called as progress_cb(done, total) after each
+    batch of INDEX_BATCH_SIZE new chunks is embedded and written, with total
+    the number of new chunks. Returns (chunks added, total chunks now in the
+    course collection).
+    """
     course_slug = _slugify(course_name)
+    collection_name = _get_collection_name(course_name)
     _ensure_dir(os.path.join(FILES_ROOT, course_slug))
     
-    texts, metas = [], []
+    ids, texts, metas = [], [], []
     
     # Process uploaded files
     progress_container = st.container()
     
-    for i, f in enumerate(uploaded_files):
+    # Save files locally for backup; a repeated file name is only written once
+    by_name = {}
+    for f in uploaded_files:
+        by_name.setdefault(f.name, f)
+    files, names = list(by_name.values()), list(by_name)
+    dests = [os.path.join(FILES_ROOT, course_slug, name) for name in names]
+    
+    def on_saved(i: int):
         with progress_container:
-            st.info(f"📄 Processing file {i+1}/{len(uploaded_files)}: {f.name}")
-        
-        # Save file locally for backup
-        dest = os.path.join(FILES_ROOT, course_slug, f.name)
-        with open(dest, "wb") as out:
-            out.write(f.read())
-
-        # Extract text
-        if dest.lower().endswith(".pdf"):
-            raw = _read_pdf(dest)
-        elif dest.lower().endswith(".txt"):
-            raw = _read_txt(dest)
-        else:
-            continue
+            st.info(f"📄 Processing file {i+1}/{len(files)}: {names[i]}")
 
-        # Split into chunks
-        for chunk in _split(raw):
-            if chunk.strip():
-                texts.append(chunk)
-                metas.append({"source": f.name, "course": course_name})
+    # Extract text, then split into chunks on this thread. Repeated chunks are
+    # dropped per file only: every file owns its chunks, so re-uploading one
+    # file must never remove text another file still contains. Chunks shared
+    # across files are still encoded once, via the chunk embedding cache.
+    for name, raw in zip(names, _extract_texts(files, dests, on_saved)):
+        if raw is None:
+            continue
+        seen = set()
+        for idx, chunk in enumerate(_split(raw)):
+            if not chunk.strip():
+                continue
+            h = hashlib.blake2b(chunk.encode(), digest_size=16).digest()
+            if h in seen:
+                continue
+            seen.add(h)
+            # Stable id: the same chunk of the same file under the same embedding
+            # model maps to the same id on every upload
+            ids.append(hashlib.sha256(
+                f"{collection_name}::{_EMBEDDING_TAG}::{name}::{idx}::{h.hex()}".encode()
+            ).hexdigest())
+            texts.append(chunk)
+            metas.append({"source": name, "course": course_name})
 
     if not texts:
-        return 0
+        return 0, 0
 
     try:
         with progress_container:
             st.info(f"🤖 Creating embeddings and uploading to ChromaDB Cloud...")
         
         client = _get_chromadb_client()
-        collection_name = _get_collection_name(course_name)
         
-        # Delete existing collection if it exists
-        try:
-            client.delete_collection(name=collection_name)
-        except:
-            pass  # Collection didn't exist
+        collection = _open_course_collection(client, collection_name)
         
-        # Create new vector store
-        vectorstore = Chroma.from_texts(
-            texts=texts,
-            metadatas=metas,
-            embedding=_get_embeddings(),
-            client=client,
-            collection_name=collection_name,
-        )
+        # Chunks of these files that are already indexed are skipped; ones the
+        # new versions of the files no longer contain are removed
+        existing = set(collection.get(where={"source": {"$in": names}}, include=[])["ids"])
+        stale = list(existing.difference(ids))
+        stale_texts = set()
+        if stale:
+            stale_texts = set(collection.get(ids=stale, include=["documents"])["documents"] or [])
+            collection.delete(ids=stale)
+        current = (ids, texts, metas)
+        keep = [j for j, i in enumerate(ids) if i not in existing]
+        ids, texts, metas = [ids[j] for j in keep], [texts[j] for j in keep], [metas[j] for j in keep]
+        
+        # Embed and write new chunks batch by batch, so progress tracks the slow
+        # embedding step and each round-trip carries many chunks. Chunks
+        # embedded by any earlier upload come from the on-disk cache.
+        added = len(texts)
+        if added:
+            embeddings = _get_embeddings()
+            chunk_cache = _get_chunk_cache()
+            for start in range(0, added, INDEX_BATCH_SIZE):
+                end = min(start + INDEX_BATCH_SIZE, added)
+                vectors = chunk_cache.get_many(
+                    texts[start:end], lambda missing: embeddings.encode(missing, batch_size=EMBED_BATCH_SIZE)
+                )
+                collection.upsert(
+                    ids=ids[start:end],
+                    embeddings=vectors.tolist(),
+                    documents=texts[start:end],
+                    metadatas=metas[start:end],
+                )
+                if progress_cb:
+                    progress_cb(end, added)
+        # Every current chunk goes to the keyword index, which may lack rows Chroma has
+        _fts_update(collection_name, stale, *current)
+        # Text that only moved within a file keeps its cached vector
+        _get_chunk_cache().forget(stale_texts.difference(current[1]))
         
         # Clear cache to reload with new data
         _clear_course_cache(course_name)
         
         with progress_container:
-            st.success(f"✅ Successfully uploaded {len(texts)} chunks to ChromaDB Cloud!")
+            st.success(f"✅ Uploaded {added} new chunks to ChromaDB Cloud!")
         
-        return len(texts)
+        return added, collection.count()
         
     except Exception as e:
         st.error(f"Error creating vector store: {e}")
-        return 0
+        return 0, 0
 
 def get_retriever(course_name: str):
     """Get retriever for the course"""
@@ -228,14 +657,18 @@ def get_retriever(course_name: str):
 
 def _clear_course_cache(course_name: str):
     """Clear cached data for a specific course"""
-    st.cache_resource.clear()
-    st.cache_data.clear()
+    with _VS_LOCK:
+        _VS_CACHE.pop(_get_collection_name(course_name), None)
+    _get_relevant_documents.clear()
+    check_course_status.clear()
 
 def clear_all_cache():
-    """Clear all cached data"""
-    st.cache_resource.clear()
+    """Clear all cached data - the embedding model and ChromaDB client stay loaded"""
+    with _VS_LOCK:
+        _VS_CACHE.clear()
     st.cache_data.clear()
 
+@st.cache_data(ttl=30, show_spinner=False)
 def check_course_status(course_name: str) -> dict:
     """Check if a course has indexed materials"""
     try:
@@ -302,17 +735,22 @@ def delete_course(course_name: str) -> bool:
         client = _get_chromadb_client()
         collection_name = _get_collection_name(course_name)
         
-        # Delete from ChromaDB
+        # Delete from ChromaDB, dropping the course's cached chunk vectors with it
+        try:
+            documents = client.get_collection(name=collection_name).get(include=["documents"])["documents"]
+            _get_chunk_cache().forget(set(documents or []))
+        except Exception as e:
+            print(f"Could not drop cached vectors of {collection_name}: {e}")
         try:
             client.delete_collection(name=collection_name)
         except:
             pass  # Collection might not exist
+        _fts_clear(collection_name)
         
         # Delete local files
         course_slug = _slugify(course_name)
         local_files_dir = os.path.join(FILES_ROOT, course_slug)
         if os.path.exists(local_files_dir):
-            import shutil
             shutil.rmtree(local_files_dir)
         
         # Clear cache
@@ -1,14 +1,56 @@
+import io
 import os
 import re
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterator
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+# Leading "A) " style label on quiz options
+_OPT_PREFIX = re.compile(r"^\s*[A-D]\)\s*", re.IGNORECASE)
+
+# Capitalized words/phrases offered as quiz topic suggestions. RE2 scans with a
+# DFA instead of backtracking; fall back to the stdlib engine if it's missing.
+# Compiled here, not in app.py: the app script re-runs on every interaction
+# and re2.compile has no cache like re's.
+try:
+    import re2 as _topic_re_engine
+except ImportError:
+    _topic_re_engine = re
+TOPIC_RE = _topic_re_engine.compile(r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b")
 
 def ensure_dir(p: str) -> None:
     Path(p).mkdir(parents=True, exist_ok=True)
 
 def slugify(text: str) -> str:
-    text = text.strip().lower()
-    text = re.sub(r"[^a-z0-9]+", "-", text)
-    return text.strip("-")
+    return _SLUG_RE.sub("-", text.strip().lower()).strip("-")
 
 def read_txt_byteslike(file) -> str:
     return file.read().decode("utf-8", errors="ignore")
+
+def iter_pdf_pages(path: str) -> Iterator[str]:
+    """Yield a PDF's text one page at a time, releasing each page once read
+
+    Only the current page is held in memory, not the parsed document.
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(path) as doc:
+        for i in range(doc.page_count):
+            page = doc.load_page(i)
+            text = page.get_text()
+            del page
+            yield text
+
+def read_pdf(path: str) -> str:
+    """Extract the text of a PDF on disk"""
+    buf = io.StringIO()
+    for text in iter_pdf_pages(path):
+        buf.write(text)
+        buf.write("\n")
+    return buf.getvalue()
+
+@lru_cache(maxsize=4096)
+def clean_option(label: str, opt: str) -> str:
+    """Normalize a quiz option to "A) text", dropping any label the model already added"""
+    return f"{label}) {_OPT_PREFIX.sub('', opt)}"